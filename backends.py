@@ -0,0 +1,122 @@
+import os
+import select
+import subprocess
+import sys
+
+from abc import ABC, abstractmethod
+from time import time
+
+
+FAKE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake.py')
+
+
+class Backend(ABC):
+    name: str
+    hosts: []
+    # whether hosts run in cgroups with CPU statistics
+    cgroups: bool
+
+    @abstractmethod
+    def start(self):
+        pass
+
+    @abstractmethod
+    def stop(self):
+        pass
+
+    # returns the receiving and the sending host
+    @abstractmethod
+    def endpoints(self):
+        pass
+
+    # returns the interfaces on which traffic control is applied
+    @abstractmethod
+    def bottleneck(self) -> [str]:
+        pass
+
+    @abstractmethod
+    def tc(self, cmd: [str]):
+        pass
+
+    @abstractmethod
+    def pmonitor(self, popens, timeoutms=500):
+        pass
+
+
+def pmonitor(popens, timeoutms=500):
+    # same protocol as mininet.util.pmonitor: yields (host, line) for each
+    # line of output and (None, '') after timeoutms without output, a host
+    # is dropped once its stdout is closed, even if it keeps running
+    poller = select.poll()
+    hosts = {}
+    for host, popen in popens.items():
+        fd = popen.stdout.fileno()
+        hosts[fd] = host
+        os.set_blocking(fd, False)
+        poller.register(fd, select.POLLIN)
+    while popens:
+        fds = poller.poll(timeoutms)
+        if not fds:
+            yield None, ''
+            continue
+        for fd, event in fds:
+            host = hosts[fd]
+            popen = popens[host]
+            if event & (select.POLLIN | select.POLLHUP):
+                while True:
+                    try:
+                        line = popen.stdout.readline()
+                    except BlockingIOError:
+                        line = b''
+                    if not line:
+                        break
+                    yield host, line.decode()
+            if event & select.POLLHUP:
+                poller.unregister(fd)
+                del popens[host]
+
+
+class LocalHost:
+    name: str
+    params: dict
+
+    def __init__(self, name: str):
+        self.name = name
+        self.params = {}
+
+    def IP(self):
+        return '127.0.0.1'
+
+    def popen(self, cmd, **kwargs):
+        # run the fake implementation with the arguments built for the real
+        # one, so command construction is exercised as well
+        return subprocess.Popen([sys.executable, FAKE] + cmd[1:], **kwargs)
+
+
+class LoopbackBackend(Backend):
+    out_dir: str
+
+    def __init__(self, out_dir: str):
+        self.name = 'loopback'
+        self.cgroups = False
+        self.out_dir = out_dir
+        self.hosts = [LocalHost('l0'), LocalHost('r0')]
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def endpoints(self):
+        return self.hosts[0], self.hosts[1]
+
+    def bottleneck(self) -> [str]:
+        return ['lo', 'lo']
+
+    def tc(self, cmd: [str]):
+        with open(os.path.join(self.out_dir, 'tc.log'), 'a') as f:
+            f.write('{}, {}\n'.format(int(time() * 1000), ' '.join(cmd)))
+
+    def pmonitor(self, popens, timeoutms=500):
+        return pmonitor(popens, timeoutms)
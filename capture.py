@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import subprocess
+
+from subprocess import TimeoutExpired, DEVNULL
+from time import time
+
+import numpy as np
+
+
+SNAPLEN = 128
+
+# bytes of UDP payload used to identify a packet on both capture points,
+# QUIC payloads are encrypted, so the packet itself is the only identifier
+KEY_LEN = 24
+
+# number of records checked at once when guessing record offsets
+MIN_RUN = 16
+MAX_RUN = 65536
+
+TS_UNITS = {
+        0xa1b2c3d4: 1000,  # microsecond timestamps
+        0xa1b23c4d: 1,     # nanosecond timestamps
+    }
+
+# link header length and offset of the ethertype field per pcap linktype
+LINKTYPES = {
+        1: (14, 12),    # Ethernet
+        113: (16, 14),  # Linux cooked capture v1
+        276: (20, 0),   # Linux cooked capture v2
+    }
+
+FIELDS = ['ts', 'length', 'src', 'udp_len', 'key', 'rtp_seq']
+
+
+class Capture:
+    intfs: [str]
+    out_dir: str
+    snaplen: int
+    file_size: int
+    files: int
+    popens: []
+
+    def __init__(self,
+                 intfs: [str],
+                 out_dir: str,
+                 snaplen: int = SNAPLEN,
+                 file_size: int = 100,
+                 files: int = 10,
+                 ):
+        self.intfs = intfs
+        self.out_dir = out_dir
+        self.snaplen = snaplen
+        self.file_size = file_size
+        self.files = files
+        self.popens = []
+
+    def start(self):
+        for intf in self.intfs:
+            cmd = [
+                'tcpdump',
+                '-i', intf,
+                '-n',
+                '-s', str(self.snaplen),
+                '-B', '8192',
+                '-C', str(self.file_size),
+                '-W', str(self.files),
+                '-Z', 'root',
+                '-w', os.path.join(self.out_dir, '{}.pcap'.format(intf)),
+                'udp',
+                ]
+            print('run cmd: {}'.format(' '.join(cmd)))
+            self.popens.append(subprocess.Popen(cmd, stdout=DEVNULL))
+
+    def stop(self):
+        for p in self.popens:
+            p.terminate()
+            try:
+                p.wait(3)
+            except TimeoutExpired:
+                p.kill()
+        self.popens = []
+
+
+def record_offsets(buf, endian):
+    # record lengths vary, so the headers form a linked list. Most records
+    # are cut to the snaplen, so guess that the following records have the
+    # same length as the current one and verify all guesses at once, fall
+    # back to walking record by record where the lengths keep changing
+    caplen = struct.Struct(endian + 'I').unpack_from
+    dtype = np.dtype(endian + 'u4')
+    lengths = np.lib.stride_tricks.sliding_window_view(buf, 4)
+    data = buf.data
+    parts = []
+    off = 24
+    end = len(buf) - 16
+    run = MIN_RUN
+    while off <= end:
+        c = caplen(data, off + 8)[0]
+        stride = 16 + c
+        n = min(run, (end - off) // stride + 1)
+        starts = off + stride * np.arange(n, dtype=np.int64)
+        found = lengths[starts + 8].view(dtype).ravel()
+        changed = np.flatnonzero(found != c)
+        if not len(changed):
+            parts.append(starts)
+            off = int(starts[-1]) + stride
+            run = min(run * 2, MAX_RUN)
+            continue
+        # the first record with a different length is still a record
+        m = changed[0]
+        parts.append(starts[:m + 1])
+        off = int(starts[m]) + 16 + int(found[m])
+        run = MIN_RUN
+        if m < MIN_RUN:
+            walked = []
+            while off <= end and len(walked) < 4 * MIN_RUN:
+                walked.append(off)
+                off += 16 + caplen(data, off + 8)[0]
+            parts.append(np.array(walked, dtype=np.int64))
+    if not parts:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.concatenate(parts)
+    # the last record may be cut short if tcpdump was killed while writing
+    last = int(offsets[-1])
+    if last + 16 + caplen(data, last + 8)[0] > len(buf):
+        offsets = offsets[:-1]
+    return offsets
+
+
+def field(rows, off, dtype):
+    dtype = np.dtype(dtype)
+    return rows[:, off:off + dtype.itemsize].view(dtype)[:, 0].astype(np.int64)
+
+
+def empty():
+    return {k: np.zeros(0, dtype=np.int64) for k in FIELDS} | {
+            'key': np.zeros(0, dtype=np.uint64),
+        }
+
+
+def read_pcap(path):
+    if os.path.getsize(path) < 24:
+        return empty()
+    with open(path, 'rb') as f:
+        buf = np.frombuffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ),
+                            dtype=np.uint8)
+    for endian in '<>':
+        magic = int(buf[:4].view(endian + 'u4')[0])
+        if magic in TS_UNITS:
+            break
+    else:
+        raise ValueError('{}: not a pcap file'.format(path))
+    linktype = int(buf[20:24].view(endian + 'u4')[0]) & 0xffff
+    if linktype not in LINKTYPES:
+        raise ValueError('{}: unsupported linktype {}'.format(path, linktype))
+    link_len, ethertype_off = LINKTYPES[linktype]
+
+    rec = record_offsets(buf, endian)
+    if not len(rec):
+        return empty()
+
+    # copy the record header and the first bytes of every packet into one
+    # row per packet, all fields below are column slices of these rows
+    ip = 16 + link_len
+    udp = ip + 20
+    payload = udp + 8
+    width = payload + KEY_LEN
+    if len(buf) < width:
+        return empty()
+    # a sliding window view turns the gather into a single index along the
+    # first axis, only records too close to the end of the file need a copy
+    windows = np.lib.stride_tricks.sliding_window_view(buf, width)
+    rows = windows[np.minimum(rec, len(windows) - 1)]
+    for i in np.flatnonzero(rec >= len(windows)):
+        tail = buf[rec[i]:]
+        rows[i] = 0
+        rows[i, :len(tail)] = tail
+
+    u4 = endian + 'u4'
+    caplen = field(rows, 8, u4)
+    # only the key bytes may lie beyond the captured length, the headers
+    # before them are checked against caplen below
+    key_bytes = rows[:, payload:]
+    key_bytes[np.arange(KEY_LEN) >= (16 + caplen - payload)[:, None]] = 0
+
+    # IP options are not expected on the bottleneck link, packets using them
+    # are skipped like non-UDP traffic
+    valid = ((field(rows, 16 + ethertype_off, '>u2') == 0x0800)
+             & (rows[:, ip] == 0x45) & (rows[:, ip + 9] == 17)
+             & (caplen >= payload - 16))
+
+    words = key_bytes.view('<u8')
+    ip_id = field(rows, ip + 4, '>u2').astype(np.uint64)
+    udp_len = field(rows, udp + 4, '>u2')
+    key = (words[:, 0]
+           ^ (words[:, 1] * np.uint64(0x9e3779b97f4a7c15))
+           ^ (words[:, 2] * np.uint64(0xc2b2ae3d27d4eb4f))
+           ^ (ip_id << np.uint64(48))
+           ^ udp_len.astype(np.uint64))
+
+    # RTP version 2, QUIC headers always have the 0x40 bit set
+    is_rtp = (rows[:, payload] & 0xc0) == 0x80
+    rtp_seq = np.where(is_rtp, field(rows, payload + 2, '>u2'), -1)
+
+    packets = {
+            'ts': (field(rows, 0, u4) * 1_000_000_000
+                   + field(rows, 4, u4) * TS_UNITS[magic]),
+            'length': field(rows, 12, u4),
+            'src': field(rows, ip + 12, '>u4'),
+            'udp_len': udp_len,
+            'key': key,
+            'rtp_seq': rtp_seq,
+        }
+    return {k: v[valid] for k, v in packets.items()}
+
+
+def read_pcaps(files):
+    parts = [read_pcap(f) for f in files]
+    packets = {k: np.concatenate([p[k] for p in parts]) if parts
+               else empty()[k] for k in FIELDS}
+    # files of a ring buffer are not necessarily in chronological order
+    order = np.argsort(packets['ts'], kind='stable')
+    return {k: v[order] for k, v in packets.items()}
+
+
+def select(packets, mask):
+    return {k: v[mask] for k, v in packets.items()}
+
+
+def match(keys, other):
+    if not len(other):
+        return np.full(len(keys), -1)
+    order = np.argsort(other)
+    sorted_keys = other[order]
+    # searching sorted keys walks both arrays in order, random lookups into
+    # a large array are dominated by cache misses
+    query = np.argsort(keys)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys[query]), len(other) - 1)
+    result = np.empty(len(keys), dtype=np.int64)
+    result[query] = np.where(sorted_keys[pos] == keys[query], order[pos], -1)
+    return result
+
+
+def read_rtp_log(file):
+    if not file:
+        return None
+    return np.loadtxt(file, delimiter=',', usecols=(0, 6, 8), ndmin=2)
+
+
+def ip_to_int(addr):
+    return struct.unpack('>I', bytes(int(b) for b in addr.split('.')))[0]
+
+
+def analyze(sender, receiver, sender_ip, rtp_sent=None, rtp_received=None):
+    src = ip_to_int(sender_ip)
+    first = select(sender, sender['src'] == src)
+    second = select(receiver, receiver['src'] == src)
+
+    idx = match(first['key'], second['key'])
+    delivered = idx >= 0
+    arrival = first['ts']
+    if len(second['ts']):
+        arrival = second['ts'][idx]
+    owd = np.where(delivered, (arrival - first['ts']) / 1e6, np.nan)
+    # packets sent outside of the receiverside capture (e.g. overwritten by
+    # the ring buffer) cannot be classified
+    known = np.zeros(len(idx), dtype=bool)
+    if len(second['ts']):
+        known = ((first['ts'] >= second['ts'][0])
+                 & (first['ts'] <= second['ts'][-1]))
+    lost = known & ~delivered
+
+    summary = {
+            'packets': int(len(idx)),
+            'delivered': int(delivered.sum()),
+            'lost_network': int(lost.sum()),
+            'unknown': int((~known & ~delivered).sum()),
+            'lost_sender': None,
+            'lost_receiver': None,
+        }
+    if delivered.any():
+        d = owd[delivered]
+        summary |= {
+                'owd_mean_ms': float(d.mean()),
+                'owd_p50_ms': float(np.percentile(d, 50)),
+                'owd_p95_ms': float(np.percentile(d, 95)),
+                'owd_p99_ms': float(np.percentile(d, 99)),
+                'owd_max_ms': float(d.max()),
+            }
+
+    headers = 28 * len(idx)
+    payload = int((first['udp_len'] - 8).sum())
+    wire = int(first['length'].sum())
+    summary |= {
+            'wire_bytes': wire,
+            'ip_udp_header_bytes': headers,
+            'udp_payload_bytes': payload,
+        }
+
+    if rtp_sent is not None and len(rtp_sent):
+        rtp = int(rtp_sent[:, 1].sum())
+        summary |= {
+                'rtp_bytes': rtp,
+                'transport_overhead': payload / rtp - 1 if rtp else None,
+                'wire_overhead': wire / rtp - 1 if rtp else None,
+            }
+
+    # sequence numbers are only visible for unencrypted RTP over UDP
+    seen = first['rtp_seq'] >= 0
+    if seen.any() and rtp_sent is not None:
+        sent_seq = rtp_sent[:, 2].astype(np.int64) % 65536
+        summary['lost_sender'] = int(
+                (~np.isin(sent_seq, first['rtp_seq'][seen])).sum())
+    if seen.any() and rtp_received is not None:
+        received_seq = rtp_received[:, 2].astype(np.int64) % 65536
+        arrived = second['rtp_seq'][idx[delivered]]
+        summary['lost_receiver'] = int(
+                (~np.isin(arrived, received_seq)).sum())
+
+    per_packet = np.column_stack([
+            first['ts'] / 1e6,
+            owd,
+            first['length'],
+            lost,
+        ])[delivered | lost]
+    return per_packet, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter
+        )
+    parser.add_argument('--sender', nargs='+', required=True,
+                        help='pcap files captured at the senderside edge of'
+                             ' the bottleneck (all files of a ring buffer)')
+    parser.add_argument('--receiver', nargs='+', required=True,
+                        help='pcap files captured at the receiverside edge of'
+                             ' the bottleneck (all files of a ring buffer)')
+    parser.add_argument('--sender-ip', default='10.0.0.2',
+                        help='IP address of the media sender')
+    parser.add_argument('--rtp-sent', help='Senderside RTP logfile used for'
+                        ' overhead and senderside drops')
+    parser.add_argument('--rtp-received', help='Receiverside RTP logfile used'
+                        ' for receiverside drops')
+    parser.add_argument('-o', '--output', required=True, help='per packet'
+                        ' output file (time, one-way delay, size, lost)')
+    parser.add_argument('--summary', help='write summary as JSON to this'
+                        ' file')
+
+    args = parser.parse_args()
+
+    start = time()
+    sender = read_pcaps(sorted(f for p in args.sender for f in glob.glob(p)))
+    receiver = read_pcaps(sorted(f for p in args.receiver
+                                 for f in glob.glob(p)))
+    parsed = time()
+
+    per_packet, summary = analyze(
+            sender,
+            receiver,
+            args.sender_ip,
+            read_rtp_log(args.rtp_sent),
+            read_rtp_log(args.rtp_received),
+        )
+
+    n = len(sender['ts']) + len(receiver['ts'])
+    print('parsed {} packets in {:.3f}s ({:.0f} packets/s)'.format(
+        n, parsed - start, n / max(parsed - start, 1e-9)))
+    print(json.dumps(summary, indent=4))
+
+    np.savetxt(args.output, per_packet, fmt=['%.3f', '%.3f', '%d', '%d'],
+               delimiter=', ')
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    main()
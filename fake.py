@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import argparse
+import socket
+import struct
+
+from time import sleep, time
+
+
+RATE = 1_000_000
+SIZE = 1200
+SSRC = 1
+FEEDBACK_INTERVAL = .1
+FEEDBACK_SIZE = 64
+
+
+def now_ms():
+    return int(time() * 1000)
+
+
+def open_log(path):
+    if not path:
+        return None
+    return open(path, 'w', buffering=1)
+
+
+def log_rtp(log, seq, size):
+    # same columns as the rtp-over-quic dumps, plot.py reads the time (0),
+    # the size (6) and the unwrapped sequence number (8)
+    t = now_ms()
+    log.write('{}, 96, {}, {}, {}, 0, {}, 0, {}\n'.format(
+        t, SSRC, seq & 0xffff, t * 90 & 0xffffffff, size, seq))
+
+
+def unwrap(seq, highest):
+    # extend a 16 bit sequence number to the one closest to the highest
+    # number seen so far, like the sender logs it
+    if highest is None:
+        return seq
+    delta = (seq - highest + 0x8000) % 0x10000 - 0x8000
+    return highest + delta
+
+
+def address(addr):
+    host, port = addr.rsplit(':', 1)
+    return host, int(port)
+
+
+def send(args):
+    rtp = open_log(args.rtp_dump)
+    rtcp = open_log(args.rtcp_dump)
+    cc = open_log(args.cc_dump)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    dst = address(args.addr)
+    print('sending to {}'.format(args.addr), flush=True)
+
+    interval = SIZE * 8 / RATE
+    seq = 0
+    next_packet = time()
+    while True:
+        packet = struct.pack('>BBHII', 0x80, 96, seq & 0xffff,
+                             now_ms() * 90 & 0xffffffff, SSRC)
+        try:
+            sock.sendto(packet + bytes(SIZE - len(packet)), dst)
+        except OSError:
+            pass
+        if rtp:
+            log_rtp(rtp, seq, SIZE)
+        if cc and seq % 10 == 0:
+            cc.write('{}, {}, {}\n'.format(now_ms(), RATE, 0.0))
+        while True:
+            try:
+                data = sock.recv(2048)
+            except OSError:
+                break
+            if rtcp:
+                rtcp.write('{}, {}\n'.format(now_ms(), len(data)))
+        seq += 1
+        next_packet += interval
+        sleep(max(0, next_packet - time()))
+
+
+def receive(args):
+    rtp = open_log(args.rtp_dump)
+    rtcp = open_log(args.rtcp_dump)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(address(args.addr))
+    sock.settimeout(FEEDBACK_INTERVAL)
+    print('listening on {}'.format(args.addr), flush=True)
+
+    peer = None
+    highest = None
+    next_feedback = time() + FEEDBACK_INTERVAL
+    while True:
+        try:
+            data, peer = sock.recvfrom(2048)
+            seq = unwrap(struct.unpack_from('>H', data, 2)[0], highest)
+            highest = seq if highest is None else max(highest, seq)
+            if rtp:
+                log_rtp(rtp, seq, len(data))
+        except socket.timeout:
+            pass
+        if peer and time() >= next_feedback:
+            next_feedback += FEEDBACK_INTERVAL
+            sock.sendto(bytes(FEEDBACK_SIZE), peer)
+            if rtcp:
+                rtcp.write('{}, {}\n'.format(now_ms(), FEEDBACK_SIZE))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            description='stand-in for rtp-over-quic that writes correctly'
+                        ' formatted logs without encoding any media'
+        )
+    parser.add_argument('mode', choices=['send', 'receive'])
+    parser.add_argument('--addr', required=True)
+    parser.add_argument('--rtp-dump')
+    parser.add_argument('--rtcp-dump')
+    parser.add_argument('--cc-dump')
+    args, _ = parser.parse_known_args()
+
+    if args.mode == 'send':
+        send(args)
+    else:
+        receive(args)
+
+
+if __name__ == "__main__":
+    main()
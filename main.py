@@ -3,9 +3,13 @@
 import argparse
 import json
 import os
+import sqlite3
 
-from mininet.log import setLogLevel
+from time import time
 
+from backends import LoopbackBackend
+from monitor import HealthRules
+from results import ResultsDB, environment
 from testcases import Implementation, VariableAvailableCapacitySingleFlow
 
 
@@ -47,10 +51,58 @@ def main():
                         help='create block profiles')
     parser.add_argument('--pprof-mutex', action=argparse.BooleanOptionalAction,
                         help='create mutex profiles')
+    parser.add_argument('--monitor', action=argparse.BooleanOptionalAction,
+                        help='tail the logs during a run, print live metrics'
+                             ' and abort runs that violate the health rules')
+    parser.add_argument('--abort-grace', type=int, default=10,
+                        help='seconds before health rules are enforced')
+    parser.add_argument('--abort-min-rate', type=float, default=0,
+                        help='abort if the receive rate in bit/s drops below')
+    parser.add_argument('--abort-max-loss', type=float, default=1.0,
+                        help='abort if the loss ratio rises above')
+    parser.add_argument('--abort-max-delay', type=float, default=0,
+                        help='abort if the mean delay in ms rises above, 0'
+                             ' disables the rule')
+    parser.add_argument('--cpu', type=float, default=.5,
+                        help='fraction of the system CPU time shared by all'
+                             ' hosts, split evenly and enforced using cgroup'
+                             ' CPU quotas, the rest is left for OVS and tc')
+    parser.add_argument('--cpu-cores', type=int, nargs='+', metavar='CORE',
+                        help='pin each host to one of the given CPU cores,'
+                             ' --cpu is then the fraction of these cores'
+                             ' shared by all hosts and the share of each host'
+                             ' must fit on the single core it is pinned to')
+    parser.add_argument('--cpu-starved-ratio', type=float, default=.1,
+                        help='flag runs in which a host was throttled in more'
+                             ' than this fraction of CPU periods')
+    parser.add_argument('--capture', action=argparse.BooleanOptionalAction,
+                        help='capture truncated packet headers at both edges'
+                             ' of the bottleneck, analyze with ./capture.py')
+    parser.add_argument('--db', default='results.db', help='SQLite results'
+                        ' database updated after each run, empty to disable')
+    parser.add_argument('--backend', default='mininet',
+                        choices=['mininet', 'loopback'],
+                        help='network backend, loopback runs fake'
+                             ' implementations on localhost without root to'
+                             ' measure the overhead of the harness itself')
+    parser.add_argument('--duration', type=int, default=100,
+                        help='duration of a test run in seconds, the traffic'
+                             ' control schedule is scaled accordingly')
     args = parser.parse_args()
+    if args.capture and args.backend == 'loopback':
+        parser.error('--capture is not supported with the loopback backend')
 
     print(args)
-    setLogLevel(args.loglevel)
+    if args.backend == 'mininet':
+        # Mininet is only imported when used, so that the loopback backend
+        # works on machines without it
+        from mininet.log import setLogLevel
+        from topology import MininetBackend, PAIRS, host_cpu
+        setLogLevel(args.loglevel)
+        try:
+            host_cpu(args.cpu, 2 * PAIRS, args.cpu_cores)
+        except ValueError as e:
+            parser.error(str(e))
 
     chosen_tests = [int(k) for k in args.tests]
 
@@ -58,7 +110,23 @@ def main():
     dst = args.output
     base_out_dir = args.dir
 
+    rules = None
+    if args.monitor:
+        rules = HealthRules(
+            args.abort_grace,
+            args.abort_min_rate,
+            args.abort_max_loss,
+            args.abort_max_delay,
+        )
+
+    db = None
+    env = None
+    if args.db:
+        db = ResultsDB(args.db)
+        env = environment()
+
     count = 0
+    failed = 0
     for k, v in enumerate(data):
         if int(k) not in chosen_tests:
             continue
@@ -85,16 +153,46 @@ def main():
             args.pprof_block,
             args.pprof_mutex,
         )
-        tc = VariableAvailableCapacitySingleFlow(implementation, out_dir)
+        if args.backend == 'mininet':
+            backend = MininetBackend(args.cpu, args.cpu_cores)
+        else:
+            backend = LoopbackBackend(out_dir)
+        tc = VariableAvailableCapacitySingleFlow(
+            implementation,
+            out_dir,
+            backend,
+            rules,
+            args.cpu_starved_ratio,
+            args.capture,
+            args.duration,
+        )
+        start = time()
         ok = tc.run()
+        if db:
+            try:
+                db.add_run(v.get('name'), out_dir, time() - start, env)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print('failed to add run to results database: {}'.format(e))
+        if not ok and tc.aborted:
+            print('aborted test run: {}: {}: {}'
+                  .format(count, k, tc.failure))
+            failed += 1
+            continue
+        if tc.cpu_starved:
+            print('test run {}: {} was CPU starved'.format(count, k))
         if not ok:
             print('failed to run test: {}: {}, stopping execution'
                   .format(count, k))
             break
         count += 1
 
+    if db:
+        db.close()
+
     print()
     print('finished {} out of {} test runs'.format(count, len(data)))
+    if failed:
+        print('aborted {} test runs'.format(failed))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+import os
+
+from collections import deque
+
+
+class LogTail:
+    path: str
+    offset: int
+    rest: bytes
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.rest = b''
+
+    def rows(self, cols: [int]) -> [[float]]:
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        self.offset += len(data)
+        # keep the trailing partial line until the writer completes it
+        *lines, self.rest = (self.rest + data).split(b'\n')
+        rows = []
+        for line in lines:
+            fields = line.split(b',')
+            try:
+                rows.append([float(fields[c]) for c in cols])
+            except (IndexError, ValueError):
+                # skip malformed rows instead of failing the run
+                continue
+        return rows
+
+
+class Window:
+    length: int
+    samples: deque
+
+    def __init__(self, length: int):
+        self.length = length
+        self.samples = deque()
+
+    def add(self, t: float, value: float):
+        self.samples.append((t, value))
+
+    def expire(self, now: float):
+        while self.samples and self.samples[0][0] < now - self.length:
+            self.samples.popleft()
+
+    def count(self) -> int:
+        return len(self.samples)
+
+    def sum(self) -> float:
+        return sum(v for _, v in self.samples)
+
+    def mean(self) -> float:
+        if not self.samples:
+            return 0.0
+        return self.sum() / len(self.samples)
+
+
+class HealthRules:
+    grace: int
+    min_rate: float
+    max_loss: float
+    max_delay: float
+
+    def __init__(self,
+                 grace: int = 10,
+                 min_rate: float = 0,
+                 max_loss: float = 1.0,
+                 max_delay: float = 0,
+                 ):
+        self.grace = grace
+        self.min_rate = min_rate
+        self.max_loss = max_loss
+        self.max_delay = max_delay
+
+
+class RunMonitor:
+    rules: HealthRules
+    window: int
+    start: float
+
+    def __init__(self, out_dir: str, rules: HealthRules, window: int = 5):
+        self.rules = rules
+        self.window = window
+        self.start = None
+
+        self.sender_rtp = LogTail(os.path.join(out_dir, 'sender_rtp.log'))
+        self.receiver_rtp = LogTail(os.path.join(out_dir, 'receiver_rtp.log'))
+        self.cc = LogTail(os.path.join(out_dir, 'cc.log'))
+
+        self.sent = Window(window * 1000)
+        self.received = Window(window * 1000)
+        self.delays = Window(window * 1000)
+        self.send_times = {}
+        self.target_rate = 0.0
+
+    def poll(self, now: float):
+        if self.start is None:
+            self.start = now
+        for t, size, nr in self.sender_rtp.rows([0, 6, 8]):
+            self.sent.add(t, size)
+            self.send_times[int(nr)] = t
+        for t, size, nr in self.receiver_rtp.rows([0, 6, 8]):
+            self.received.add(t, size)
+            sent = self.send_times.pop(int(nr), None)
+            if sent is not None:
+                self.delays.add(t, t - sent)
+        for _, rate in self.cc.rows([0, 1]):
+            self.target_rate = rate
+
+        ms = now * 1000
+        for w in [self.sent, self.received, self.delays]:
+            w.expire(ms)
+
+    def elapsed(self, now: float) -> float:
+        return now - self.start
+
+    def rate(self, window: Window, now: float) -> float:
+        seconds = min(self.window, max(self.elapsed(now), 1))
+        return window.sum() * 8 / seconds
+
+    def loss(self) -> float:
+        if not self.sent.count():
+            return 0.0
+        return max(0.0, 1 - self.received.count() / self.sent.count())
+
+    def status(self, now: float) -> str:
+        return ('{:.0f}s: sent {:.2f} Mbit/s, received {:.2f} Mbit/s, '
+                'target {:.2f} Mbit/s, loss {:.1%}, delay {:.0f} ms'.format(
+                    self.elapsed(now),
+                    self.rate(self.sent, now) / 1e6,
+                    self.rate(self.received, now) / 1e6,
+                    self.target_rate / 1e6,
+                    self.loss(),
+                    self.delays.mean(),
+                ))
+
+    def check(self, now: float) -> str:
+        if self.elapsed(now) < self.rules.grace:
+            return None
+        if not self.sent.count():
+            return 'no RTP packets sent in the last {}s'.format(self.window)
+        rate = self.rate(self.received, now)
+        if rate < self.rules.min_rate:
+            return 'receive rate {:.0f} bit/s below {:.0f} bit/s'.format(
+                rate, self.rules.min_rate)
+        loss = self.loss()
+        if loss > self.rules.max_loss:
+            return 'loss {:.1%} above {:.1%}'.format(loss, self.rules.max_loss)
+        delay = self.delays.mean()
+        if self.rules.max_delay and delay > self.rules.max_delay:
+            return 'delay {:.0f} ms above {:.0f} ms'.format(
+                delay, self.rules.max_delay)
+        return None
@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import zlib
+
+from time import localtime, strftime, time
+
+import numpy as np
+
+
+INTERVAL = 100
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    test INTEGER,
+    out_dir TEXT,
+    started REAL,
+    wall_time REAL,
+    ok INTEGER,
+    aborted INTEGER,
+    failure TEXT,
+    cpu_starved INTEGER,
+    transport TEXT,
+    rtp_cc TEXT,
+    quic_cc TEXT,
+    rtcp_feedback TEXT,
+    stream INTEGER,
+    sender_rfc8888 INTEGER,
+    config TEXT,
+    environment TEXT,
+    backend TEXT,
+    test_duration INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_name ON runs (name, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE UNIQUE INDEX IF NOT EXISTS runs_unique ON runs (out_dir, started);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, run_id);
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT,
+    start INTEGER,
+    interval INTEGER,
+    data BLOB,
+    PRIMARY KEY (run_id, name)
+);
+'''
+
+
+def git_commit(path='.'):
+    try:
+        out = subprocess.run(['git', '-C', path, 'rev-parse', 'HEAD'],
+                             capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def environment():
+    return {
+            'hostname': socket.gethostname(),
+            'kernel': platform.release(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'commit': git_commit(),
+            'rtp-over-quic': git_commit('rtp-over-quic'),
+        }
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def read_log(path, cols):
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return None
+    # the last line may be incomplete if a process was killed while writing
+    data = np.genfromtxt(path, delimiter=',', usecols=cols,
+                         invalid_raise=False, ndmin=2)
+    data = data[~np.isnan(data).any(axis=1)]
+    return data if len(data) else None
+
+
+def match(keys, other):
+    # index of each key in other, -1 if it is missing
+    if not len(other):
+        return np.full(len(keys), -1)
+    order = np.argsort(other)
+    sorted_keys = other[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(other) - 1)
+    return np.where(sorted_keys[pos] == keys, order[pos], -1)
+
+
+def downsample(t, values, basetime, agg='mean'):
+    bins = ((t - basetime) // INTERVAL).astype(np.int64)
+    keep = bins >= 0
+    bins, values = bins[keep], values[keep]
+    if not len(bins):
+        return np.zeros(0, dtype=np.float32)
+    sums = np.bincount(bins, weights=values)
+    if agg == 'rate':
+        return (sums * 8 * 1000 / INTERVAL).astype(np.float32)
+    counts = np.bincount(bins)
+    with np.errstate(invalid='ignore'):
+        return (sums / counts).astype(np.float32)
+
+
+def percentiles(prefix, values):
+    if values is None or not len(values):
+        return {}
+    return {
+            prefix + '_mean': float(values.mean()),
+            prefix + '_p50': float(np.percentile(values, 50)),
+            prefix + '_p95': float(np.percentile(values, 95)),
+            prefix + '_p99': float(np.percentile(values, 99)),
+            prefix + '_max': float(values.max()),
+        }
+
+
+def summarize(out_dir, basetime):
+    metrics = {}
+    series = {}
+
+    sent = read_log(os.path.join(out_dir, 'sender_rtp.log'), (0, 6, 8))
+    received = read_log(os.path.join(out_dir, 'receiver_rtp.log'), (0, 6, 8))
+    if sent is not None:
+        seconds = max((sent[-1, 0] - sent[0, 0]) / 1000, 1)
+        metrics['sent_packets'] = len(sent)
+        metrics['sent_rate_mean'] = float(sent[:, 1].sum() * 8 / seconds)
+        series['sent_rate'] = downsample(sent[:, 0], sent[:, 1], basetime,
+                                         'rate')
+    if received is not None:
+        seconds = max((received[-1, 0] - received[0, 0]) / 1000, 1)
+        metrics['received_packets'] = len(received)
+        metrics['received_rate_mean'] = float(
+                received[:, 1].sum() * 8 / seconds)
+        series['received_rate'] = downsample(
+                received[:, 0], received[:, 1], basetime, 'rate')
+    if sent is not None and received is not None:
+        idx = match(received[:, 2], sent[:, 2])
+        found = idx >= 0
+        latency = received[found, 0] - sent[idx[found], 0]
+        lost = len(sent) - len(np.unique(idx[found]))
+        metrics['loss_rate'] = lost / len(sent)
+        metrics |= percentiles('latency', latency)
+        series['latency'] = downsample(sent[idx[found], 0], latency,
+                                       basetime)
+
+    cc = read_log(os.path.join(out_dir, 'cc.log'), (0, 1, 2))
+    if cc is not None:
+        metrics['target_rate_mean'] = float(cc[:, 1].mean())
+        metrics |= percentiles('qdelay', cc[:, 2])
+        series['target_rate'] = downsample(cc[:, 0], cc[:, 1], basetime)
+        series['qdelay'] = downsample(cc[:, 0], cc[:, 2], basetime)
+
+    cpu = read_json(os.path.join(out_dir, 'cpu.json'))
+    ratios = [h['throttled_ratio'] for h in cpu.values()
+              if h.get('throttled_ratio') is not None]
+    if ratios:
+        metrics['cpu_throttled_ratio_max'] = max(ratios)
+
+    harness = read_json(os.path.join(out_dir, 'harness.json'))
+    if harness:
+        metrics |= {
+                'harness_setup_ms': harness['setup_ms'],
+                'harness_launch_ms': harness['launch_ms'],
+                'harness_teardown_ms': harness['teardown_ms'],
+                'harness_tc_lateness_max_ms': harness['tc_lateness']['max_ms'],
+                'harness_tick_lateness_max_ms':
+                    harness['tick_lateness']['max_ms'],
+            }
+
+    return metrics, series
+
+
+class ResultsDB:
+    path: str
+    conn: sqlite3.Connection
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def add_run(self, name, out_dir, wall_time=None, env=None):
+        out_dir = os.path.abspath(out_dir)
+        config = read_json(os.path.join(out_dir, 'config.json'))
+        result = read_json(os.path.join(out_dir, 'result.json'))
+        basetime = config.get('basetime', 0)
+        # a directory is indexed once per run, importing it again is a no-op
+        if self.conn.execute(
+                'SELECT 1 FROM runs WHERE out_dir = ? AND started = ?',
+                (out_dir, basetime / 1000)).fetchone():
+            return None
+        metrics, series = summarize(out_dir, basetime)
+
+        with self.conn:
+            cur = self.conn.execute(
+                    'INSERT INTO runs (name, test, out_dir, started, wall_time,'
+                    ' ok, aborted, failure, cpu_starved, transport, rtp_cc,'
+                    ' quic_cc, rtcp_feedback, stream, sender_rfc8888, config,'
+                    ' environment, backend, test_duration)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,'
+                    ' ?, ?, ?)',
+                    (
+                        name,
+                        config.get('name'),
+                        out_dir,
+                        basetime / 1000,
+                        wall_time,
+                        result.get('ok'),
+                        result.get('aborted'),
+                        result.get('failure'),
+                        result.get('cpu_starved'),
+                        config.get('transport'),
+                        config.get('rtp_cc'),
+                        config.get('quic_cc'),
+                        config.get('rtcp_feedback'),
+                        config.get('stream'),
+                        config.get('sender_rfc8888'),
+                        json.dumps(config),
+                        json.dumps(env or {}),
+                        # output directories written before the backends
+                        # were added all come from 100s Mininet runs
+                        config.get('backend', 'mininet'),
+                        config.get('duration', 100),
+                    ))
+            run_id = cur.lastrowid
+            self.conn.executemany(
+                    'INSERT INTO metrics VALUES (?, ?, ?)',
+                    [(run_id, k, v) for k, v in metrics.items()])
+            self.conn.executemany(
+                    'INSERT INTO series VALUES (?, ?, ?, ?, ?)',
+                    [(run_id, k, basetime, INTERVAL,
+                      zlib.compress(v.astype('<f4').tobytes()))
+                     for k, v in series.items()])
+        return run_id
+
+    def query_runs(self, query, params, name, backend, test_duration, last):
+        for column, value in [('r.name', name), ('r.backend', backend),
+                              ('r.test_duration', test_duration)]:
+            if value:
+                query += ' AND {} = ?'.format(column)
+                params.append(value)
+        query += ' ORDER BY r.started DESC'
+        if last:
+            query += ' LIMIT ?'
+            params.append(last)
+        return self.conn.execute(query, params).fetchall()
+
+    def runs(self, name=None, backend='mininet', test_duration=None,
+             last=None):
+        query = ('SELECT r.id, r.name, r.started, r.ok, r.failure FROM runs r'
+                 ' WHERE 1')
+        return self.query_runs(query, [], name, backend, test_duration, last)
+
+    def metric(self, metric, name=None, backend='mininet', test_duration=None,
+               last=None):
+        query = ('SELECT r.id, r.name, r.started, m.value FROM metrics m'
+                 ' JOIN runs r ON r.id = m.run_id WHERE m.name = ?')
+        return self.query_runs(query, [metric], name, backend, test_duration,
+                               last)
+
+    def series(self, run_id, name):
+        row = self.conn.execute(
+                'SELECT start, interval, data FROM series'
+                ' WHERE run_id = ? AND name = ?', (run_id, name)).fetchone()
+        if not row:
+            return None
+        start, interval, data = row
+        values = np.frombuffer(zlib.decompress(data), dtype='<f4')
+        return start + np.arange(len(values)) * interval, values
+
+
+def fmt_time(t):
+    return strftime('%Y-%m-%d %X', localtime(t))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter
+        )
+    parser.add_argument('--db', default='results.db', help='results database')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('import', help='index existing output directories')
+    p.add_argument('dirs', nargs='+', help='output directories of test runs')
+    p.add_argument('--implementations', default='implementations.json',
+                   help='JSON file used to look up test names')
+
+    p = sub.add_parser('runs', help='list runs')
+    p.add_argument('--name', help='implementation name')
+    p.add_argument('--backend', default='mininet', help='only runs using'
+                   ' this backend, empty for all backends')
+    p.add_argument('--duration', type=int, help='only runs of this'
+                   ' configured duration in seconds')
+    p.add_argument('--last', type=int, help='only the last N runs')
+
+    p = sub.add_parser('metric', help='show a metric across runs')
+    p.add_argument('metric', help='metric name, e.g. latency_p95')
+    p.add_argument('--name', help='implementation name')
+    p.add_argument('--backend', default='mininet', help='only runs using'
+                   ' this backend, empty for all backends')
+    p.add_argument('--duration', type=int, help='only runs of this'
+                   ' configured duration in seconds')
+    p.add_argument('--last', type=int, help='only the last N runs')
+
+    p = sub.add_parser('series', help='print a downsampled timeseries')
+    p.add_argument('run', type=int, help='run id')
+    p.add_argument('series', help='series name, e.g. received_rate')
+
+    p = sub.add_parser('sql', help='run an SQL query')
+    p.add_argument('query')
+
+    args = parser.parse_args()
+
+    start = time()
+    db = ResultsDB(args.db)
+
+    if args.command == 'import':
+        with open(args.implementations) as json_file:
+            data = json.load(json_file)
+        env = environment()
+        for d in args.dirs:
+            test = read_json(os.path.join(d, 'config.json')).get('name')
+            if test is None:
+                print('skipping {}: no config.json'.format(d))
+                continue
+            name = data[test].get('name') if test < len(data) else None
+            run_id = db.add_run(name, d, env=env)
+            if run_id is None:
+                print('skipping {}: already indexed'.format(d))
+                continue
+            print('imported {} as run {}'.format(d, run_id))
+
+    if args.command == 'runs':
+        for run_id, name, started, ok, failure in db.runs(
+                args.name, args.backend, args.duration, args.last):
+            status = 'unknown' if ok is None else 'ok' if ok else 'failed'
+            print('{}, {}, {}, {}, {}'.format(
+                run_id, fmt_time(started), name, status, failure or ''))
+
+    if args.command == 'metric':
+        rows = db.metric(args.metric, args.name, args.backend, args.duration,
+                         args.last)
+        for run_id, name, started, value in rows:
+            print('{}, {}, {}, {}'.format(run_id, fmt_time(started), name,
+                                          value))
+        if rows:
+            values = np.array([r[3] for r in rows])
+            print('runs: {}, mean: {}, min: {}, max: {}'.format(
+                len(values), values.mean(), values.min(), values.max()))
+
+    if args.command == 'series':
+        data = db.series(args.run, args.series)
+        if data is None:
+            print('no series {} for run {}'.format(args.series, args.run))
+        else:
+            for t, v in zip(*data):
+                print('{}, {}'.format(t, v))
+
+    if args.command == 'sql':
+        for row in db.conn.execute(args.query):
+            print(', '.join(str(c) for c in row))
+
+    db.close()
+    print('took {:.1f} ms'.format((time() - start) * 1000), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
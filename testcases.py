@@ -1,17 +1,14 @@
 import json
 import os
-import subprocess
 
 from pathlib import Path
 from subprocess import TimeoutExpired, PIPE
 from time import time, localtime, strftime
 from threading import Timer
 
-from mininet.clean import cleanup
-from mininet.net import Mininet
-from mininet.util import pmonitor, dumpNodeConnections
-
-from topology import DumbbellTopo
+from backends import Backend
+from capture import Capture
+from monitor import HealthRules, RunMonitor
 
 
 class Implementation:
@@ -148,7 +145,7 @@ class Implementation:
         return cmd
 
 
-def update_link(i1, i2, bw, is_first, log):
+def update_link(tc, i1, i2, bw, is_first, log):
     def update():
         print('found interfaces: {}, {}'.format(i1, i2))
         t = int(time() * 1000)
@@ -167,36 +164,145 @@ def update_link(i1, i2, bw, is_first, log):
                     )
             print('run cmd: {}'.format(qdisc_cmd))
             print('run cmd: {}'.format(netem_cmd))
-            subprocess.run(qdisc_cmd.split(' '))
-            subprocess.run(netem_cmd.split(' '))
+            tc(qdisc_cmd.split(' '))
+            tc(netem_cmd.split(' '))
         with open(log, 'a') as f:
             f.write('{}, {}\n'.format(t, bw * 1_000_000))
 
     return update
 
 
+def read_cpu_stat(name):
+    # cgroup v2 keeps all controllers in one tree, v1 mounts cpu separately
+    # and reports throttled_time in nanoseconds
+    for path in ['/sys/fs/cgroup/{}/cpu.stat'.format(name),
+                 '/sys/fs/cgroup/cpu/{}/cpu.stat'.format(name),
+                 '/sys/fs/cgroup/cpu,cpuacct/{}/cpu.stat'.format(name)]:
+        try:
+            with open(path) as f:
+                stat = dict(line.split() for line in f if line.strip())
+        except FileNotFoundError:
+            continue
+        stat = {k: int(v) for k, v in stat.items()}
+        if 'throttled_time' in stat:
+            stat['throttled_usec'] = stat['throttled_time'] // 1000
+        return stat
+    return None
+
+
+def throttling(before, after):
+    keys = ['nr_periods', 'nr_throttled', 'throttled_usec']
+    if before is None or after is None:
+        # nothing was measured, which is not the same as no throttling
+        return dict.fromkeys(keys + ['throttled_ratio'])
+    stats = {}
+    for k in keys:
+        stats[k] = after.get(k, 0) - before.get(k, 0)
+    stats['throttled_ratio'] = 0.0
+    if stats['nr_periods']:
+        stats['throttled_ratio'] = stats['nr_throttled'] / stats['nr_periods']
+    return stats
+
+
+def lateness(samples):
+    return {
+            'count': len(samples),
+            'mean_ms': sum(samples) / len(samples) * 1000 if samples else 0,
+            'max_ms': max(samples) * 1000 if samples else 0,
+        }
+
+
 class VariableAvailableCapacitySingleFlow():
     implementation: Implementation
     out_dir: str
+    backend: Backend
     timers: []
+    rules: HealthRules
+    failure: str
+    aborted: bool
+    starved_ratio: float
+    cpu_starved: bool
+    capture: bool
+    duration: int
+    tc_lateness: [float]
+    tick_lateness: [float]
 
     def __init__(
             self,
             implementation: Implementation,
             out_dir: str,
+            backend: Backend,
+            rules: HealthRules = None,
+            starved_ratio: float = .1,
+            capture: bool = False,
+            duration: int = 100,
             ):
         self.implementation = implementation
         self.out_dir = out_dir
+        self.backend = backend
         self.timers = []
+        self.rules = rules
+        self.failure = None
+        self.aborted = False
+        self.starved_ratio = starved_ratio
+        self.cpu_starved = None
+        self.capture = capture
+        self.duration = duration
+        self.tc_lateness = []
+        self.tick_lateness = []
 
-    @staticmethod
-    def net() -> Mininet:
-        topo = DumbbellTopo(n=1)
-        net = Mininet(topo=topo, autoStaticArp=True)
-        dumpNodeConnections(net.hosts)
-        return net
+    def read_cpu_stats(self):
+        if not self.backend.cgroups:
+            return None
+        return {h.name: read_cpu_stat(h.name) for h in self.backend.hosts}
 
-    def start_traffic_control(self, s1, s2):
+    def dump_cpu_stats(self, before):
+        if not self.backend.cgroups:
+            return
+        after = self.read_cpu_stats()
+        stats = {}
+        for h in self.backend.hosts:
+            stats[h.name] = {
+                    'cpu': h.params.get('cpu'),
+                    'cores': h.params.get('cores'),
+                } | throttling(before[h.name], after[h.name])
+            ratio = stats[h.name]['throttled_ratio']
+            if ratio is None:
+                print('warning: no cgroup CPU statistics found for {}'.format(
+                    h.name))
+            elif ratio > self.starved_ratio:
+                print('{} was throttled in {:.1%} of CPU periods'.format(
+                    h.name, ratio))
+        ratios = [s['throttled_ratio'] for s in stats.values()]
+        if any(r is not None and r > self.starved_ratio for r in ratios):
+            self.cpu_starved = True
+        elif None not in ratios:
+            self.cpu_starved = False
+        cpu_file = os.path.join(self.out_dir, 'cpu.json')
+        with open(cpu_file, 'w', encoding='utf-8') as file:
+            json.dump(stats, file, ensure_ascii=False, indent=4)
+
+    def dump_harness_stats(self, setup, launch, teardown):
+        harness_file = os.path.join(self.out_dir, 'harness.json')
+        with open(harness_file, 'w', encoding='utf-8') as file:
+            stats = {
+                    'backend': self.backend.name,
+                    'setup_ms': setup * 1000,
+                    'launch_ms': launch * 1000,
+                    'teardown_ms': teardown * 1000,
+                    'tc_lateness': lateness(self.tc_lateness),
+                    'tick_lateness': lateness(self.tick_lateness),
+                }
+            json.dump(stats, file, ensure_ascii=False, indent=4)
+
+    def timed(self, update, scheduled):
+        def run():
+            self.tc_lateness.append(time() - scheduled)
+            update()
+
+        return run
+
+    def start_traffic_control(self):
         reference = 1.0
         tc_config = [
                 {'start_time': 0, 'ratio': 1.0},
@@ -206,16 +312,23 @@ class VariableAvailableCapacitySingleFlow():
                 {'start_time': 100, 'ratio': 1.0},
                 ]
 
+        i1, i2 = self.backend.bottleneck()
+        scale = self.duration / 100
+        start = time()
         is_first = True
         for c in tc_config:
             t = Timer(
-                    c['start_time'],
-                    update_link(
-                        s1.intf('ls1-eth2'),
-                        s2.intf('rs1-eth2'),
-                        c['ratio'] * reference,
-                        is_first,
-                        os.path.join(self.out_dir, 'capacity.log'),
+                    c['start_time'] * scale,
+                    self.timed(
+                        update_link(
+                            self.backend.tc,
+                            i1,
+                            i2,
+                            c['ratio'] * reference,
+                            is_first,
+                            os.path.join(self.out_dir, 'capacity.log'),
+                            ),
+                        start + c['start_time'] * scale,
                         ),
                     )
             is_first = False
@@ -231,26 +344,63 @@ class VariableAvailableCapacitySingleFlow():
         with open(config_file, 'w', encoding='utf-8') as file:
             config = {
                     'basetime': int(start * 1000),
+                    'backend': self.backend.name,
+                    'duration': self.duration,
                 } | self.implementation.__dict__
             json.dump(config, file, ensure_ascii=False, indent=4)
 
+    def dump_result(self, ok):
+        result_file = os.path.join(self.out_dir, 'result.json')
+        with open(result_file, 'w', encoding='utf-8') as file:
+            result = {
+                    'ok': ok,
+                    'aborted': self.aborted,
+                    'failure': self.failure,
+                    'cpu_starved': self.cpu_starved,
+                }
+            json.dump(result, file, ensure_ascii=False, indent=4)
+
+    def check_health(self, monitor, popens, t):
+        for h, p in popens.items():
+            if p.poll() is not None:
+                return '{} exited with code {}'.format(h.name, p.returncode)
+        monitor.poll(t)
+        print(monitor.status(t))
+        return monitor.check(t)
+
     def run(self):
-        net = self.net()
-        net.start()
-        h1, h2 = net.getNodeByName('l0', 'r0')
-        s1, s2 = net.getNodeByName('ls1', 'rs1')
-        dumpNodeConnections(net.hosts)
+        setup = time()
+        self.backend.start()
+        h1, h2 = self.backend.endpoints()
+        setup = time() - setup
+        cpu_stats = self.read_cpu_stats()
 
+        popens = {}
+        capture = None
+        monitor = None
+        launch = 0
+        if self.rules:
+            monitor = RunMonitor(self.out_dir, self.rules)
         try:
             Path(self.out_dir).mkdir(parents=True, exist_ok=True)
 
             start = time()
-            seconds = 100
-            endTime = start + seconds
+            endTime = start + self.duration
+            if monitor:
+                monitor.start = start
             print('run until {}'.format(strftime('%X', localtime(endTime))))
 
             self.dump_config(start)
-            self.start_traffic_control(s1, s2)
+            if self.capture:
+                # the sender r0 is attached to rs1, capture where its packets
+                # enter the switches (rs1-eth2, before any shaping) and where
+                # they leave towards l0 (ls1-eth2, after its egress qdisc).
+                # The one-way delay of media packets covers the switches and
+                # the ls1-eth2 queue, the rs1-eth2 qdisc only shapes feedback
+                capture = Capture(self.backend.bottleneck()[::-1],
+                                  self.out_dir)
+                capture.start()
+            self.start_traffic_control()
 
             send_cmd = self.implementation.receive_cmd(h1.IP(), "4242")
             receive_cmd = self.implementation.send_cmd(h1.IP(), "4242")
@@ -258,28 +408,55 @@ class VariableAvailableCapacitySingleFlow():
             print(' '.join(send_cmd))
             print(' '.join(receive_cmd))
 
-            popens = {}
+            launch = time()
             popens[h1] = h1.popen(send_cmd, stderr=PIPE, stdout=PIPE)
             popens[h2] = h2.popen(receive_cmd, stderr=PIPE, stdout=PIPE)
+            launch = time() - launch
 
-            for h, line in pmonitor(popens, timeoutms=1000):
+            nextCheck = start + 1
+            # pmonitor removes hosts from the dict it is given once their
+            # output is closed, pass a copy so the health check still sees them
+            pm = self.backend.pmonitor(dict(popens), timeoutms=1000)
+            for h, line in pm:
                 t = time()
                 if h:
                     print('{}: {}: {}'.format(int(t * 1000), h.name, line))
                 if t >= endTime:
                     print('time over')
                     break
+                if t < nextCheck:
+                    continue
+                self.tick_lateness.append(t - nextCheck)
+                nextCheck = t + 1
+                if monitor:
+                    self.failure = self.check_health(monitor, popens, t)
+                    if self.failure:
+                        print('aborting run: {}'.format(self.failure))
+                        self.aborted = True
+                        break
+            else:
+                # pmonitor only ends on its own once all processes closed
+                # their output, e.g. because both rejected their command line
+                self.failure = ', '.join(
+                        '{} exited with code {}'.format(h.name, p.returncode)
+                        if p.poll() is not None
+                        else '{} closed its output'.format(h.name)
+                        for h, p in popens.items())
+                print('aborting run: {}'.format(self.failure))
+                self.aborted = True
 
-            ok = True
+            ok = self.failure is None
 
         except (KeyboardInterrupt, Exception) as e:
             if isinstance(e, KeyboardInterrupt):
                 print("got KeyboardInterrupt, stopping mnet")
             else:
                 print(e)
+                self.failure = str(e)
             ok = False
         finally:
             print('stopping...')
+            teardown = time()
             for p in popens.values():
                 p.terminate()
                 try:
@@ -289,7 +466,15 @@ class VariableAvailableCapacitySingleFlow():
                 except TimeoutExpired:
                     p.kill()
                     print('killed {}'.format(p))
-            net.stop()
+            if capture:
+                capture.stop()
+            try:
+                self.dump_cpu_stats(cpu_stats)
+            except OSError as e:
+                print('failed to record cpu stats: {}'.format(e))
+            self.backend.stop()
             self.stop_traffic_control()
-            cleanup()
+            teardown = time() - teardown
+            self.dump_harness_stats(setup, launch, teardown)
+            self.dump_result(ok)
             return ok
@@ -1,4 +1,35 @@
+import subprocess
+
+from mininet.clean import cleanup
+from mininet.net import Mininet
+from mininet.node import CPULimitedHost
 from mininet.topo import Topo
+from mininet.util import custom, pmonitor, dumpNodeConnections, numCores
+
+from backends import Backend
+
+# number of sender/receiver host pairs in the dumbbell
+PAIRS = 1
+
+
+def host_cpu(cpu, hosts, cores=None):
+    # CPULimitedHost sets the CFS quota to a fraction of all cores. Pinned
+    # hosts share the listed cores instead, and each host runs on one of them
+    share = cpu / hosts
+    if not cores:
+        return share
+    if share * len(cores) > 1:
+        raise ValueError(
+                '{:.2f} cores per host do not fit on the single core each'
+                ' host is pinned to, lower --cpu or list fewer cores'.format(
+                    share * len(cores)))
+    return share * len(cores) / numCores()
+
+
+def pin(cores, i):
+    if not cores:
+        return None
+    return [cores[i % len(cores)]]
 
 
 class SingleSwitchTopo(Topo):
@@ -13,13 +44,55 @@ class SingleSwitchTopo(Topo):
 
 
 class DumbbellTopo(Topo):
-    def build(self, n=2):
+    def build(self, n=2, cpu=.5, cores=None):
         left_switch = self.addSwitch('ls1')
         right_switch = self.addSwitch('rs1')
         self.addLink(left_switch, right_switch)
 
+        share = host_cpu(cpu, 2 * n, cores)
         for h in range(n):
-            left_host = self.addHost('l{}'.format(h), cpu=.5 / n)
+            left_host = self.addHost('l{}'.format(h), cpu=share,
+                                     cores=pin(cores, 2 * h))
             self.addLink(left_host, left_switch)
-            right_host = self.addHost('r{}'.format(h), cpu=.5 / n)
+            right_host = self.addHost('r{}'.format(h), cpu=share,
+                                      cores=pin(cores, 2 * h + 1))
             self.addLink(right_host, right_switch)
+
+
+class MininetBackend(Backend):
+    cpu: float
+    cores: [int]
+    net: Mininet
+
+    def __init__(self, cpu: float = .5, cores: [int] = None):
+        self.name = 'mininet'
+        self.cgroups = True
+        self.cpu = cpu
+        self.cores = cores
+        self.net = None
+        self.hosts = []
+
+    def start(self):
+        topo = DumbbellTopo(n=PAIRS, cpu=self.cpu, cores=self.cores)
+        host = custom(CPULimitedHost, sched='cfs', period_us=100000)
+        self.net = Mininet(topo=topo, host=host, autoStaticArp=True)
+        self.net.start()
+        self.hosts = self.net.hosts
+        dumpNodeConnections(self.hosts)
+
+    def stop(self):
+        self.net.stop()
+        cleanup()
+
+    def endpoints(self):
+        return self.net.getNodeByName('l0', 'r0')
+
+    def bottleneck(self) -> [str]:
+        s1, s2 = self.net.getNodeByName('ls1', 'rs1')
+        return [s1.intf('ls1-eth2').name, s2.intf('rs1-eth2').name]
+
+    def tc(self, cmd: [str]):
+        subprocess.run(cmd)
+
+    def pmonitor(self, popens, timeoutms=500):
+        return pmonitor(popens, timeoutms=timeoutms)